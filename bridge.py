@@ -18,10 +18,14 @@ import ctypes
 from ctypes import (c_double, 
                     c_char_p,
                     c_uint16,
+                    c_int,
                     c_int32,
-                    c_bool)
+                    c_bool,
+                    c_void_p,
+                    POINTER)
 
-from math import fmod, pi, degrees, sqrt
+from math import fmod, pi, degrees, sqrt, floor
+from struct import unpack_from
 
 # Loads the compiled shared library based on libfira.cpp
 # See README.md to compile and usage
@@ -40,28 +44,114 @@ except Exception as e:
             print("Could not open lib in any directory")
             exit()
 
-# set the return types for the lib functions (to double)
+# set the argument and return types for the lib functions once,
+# so ctypes converts plain python values on every call
+lib.vision_init.argtypes = [c_char_p, c_uint16]
+lib.vision_init.restype = None
+lib.vision_set_rcvbuf.argtypes = [c_int]
+lib.vision_set_rcvbuf.restype = None
+lib.vision_update_field.argtypes = []
+lib.vision_update_field.restype = c_int
+lib.vision_term.argtypes = []
+lib.vision_term.restype = None
+
+lib.vision_get_ball_x.argtypes = []
 lib.vision_get_ball_x.restype = c_double
+lib.vision_get_ball_y.argtypes = []
 lib.vision_get_ball_y.restype = c_double
+lib.vision_get_ball_vx.argtypes = []
 lib.vision_get_ball_vx.restype = c_double
+lib.vision_get_ball_vy.argtypes = []
 lib.vision_get_ball_vy.restype = c_double
+
+lib.vision_robot_x.argtypes = [c_int32, c_bool]
 lib.vision_robot_x.restype = c_double
+lib.vision_robot_y.argtypes = [c_int32, c_bool]
 lib.vision_robot_y.restype = c_double
+lib.vision_robot_angle.argtypes = [c_int32, c_bool]
 lib.vision_robot_angle.restype = c_double
+lib.vision_robot_vx.argtypes = [c_int32, c_bool]
 lib.vision_robot_vx.restype = c_double
+lib.vision_robot_vy.argtypes = [c_int32, c_bool]
 lib.vision_robot_vy.restype = c_double
+lib.vision_robot_vangle.argtypes = [c_int32, c_bool]
 lib.vision_robot_vangle.restype = c_double
 
+# the field struct is read directly, see get_field_data
+lib.vision_get_field_ptr.argtypes = []
+lib.vision_get_field_ptr.restype = c_void_p
+
+lib.referee_init.argtypes = [c_char_p, c_uint16]
+lib.referee_init.restype = None
+lib.referee_set_rcvbuf.argtypes = [c_int]
+lib.referee_set_rcvbuf.restype = None
+lib.referee_update.argtypes = []
+lib.referee_update.restype = None
+lib.referee_wait_update.argtypes = [c_int]
+lib.referee_wait_update.restype = c_int
+lib.referee_get_interrupt_type.argtypes = []
+lib.referee_get_interrupt_type.restype = c_int
+lib.referee_interrupt_color.argtypes = []
+lib.referee_interrupt_color.restype = c_int
+lib.referee_get_interrupt_quadrant.argtypes = []
+lib.referee_get_interrupt_quadrant.restype = c_int
+lib.referee_term.argtypes = []
+lib.referee_term.restype = None
+
+lib.actuator_init.argtypes = [c_char_p, c_uint16, c_bool]
+lib.actuator_init.restype = None
+lib.actuator_send_command.argtypes = [c_int32, c_double, c_double]
+lib.actuator_send_command.restype = None
+lib.actuator_send_all.argtypes = [POINTER(c_double), c_int]
+lib.actuator_send_all.restype = None
+lib.actuator_term.argtypes = []
+lib.actuator_term.restype = None
+
+lib.replacer_init.argtypes = [c_char_p, c_uint16, c_bool]
+lib.replacer_init.restype = None
+lib.replacer_place_robot.argtypes = [c_int32, c_double, c_double, c_double]
+lib.replacer_place_robot.restype = None
+lib.replacer_place_all.argtypes = [POINTER(c_double), c_int]
+lib.replacer_place_all.restype = None
+lib.replacer_send_frame.argtypes = []
+lib.replacer_send_frame.restype = None
+lib.replacer_term.argtypes = []
+lib.replacer_term.restype = None
+
+lib.pid_step.argtypes = [POINTER(c_double), 
+                            POINTER(c_double), 
+                            POINTER(c_double), 
+                            POINTER(c_double), 
+                            c_int, 
+                            c_double, 
+                            c_double, 
+                            c_double, 
+                            c_double]
+lib.pid_step.restype = None
+
 NUM_BOTS = 3
 
 LENGTH = 1.7 / 2.0
 WIDTH = 1.3 / 2.0
 
+# default socket receive buffer, large enough to absorb bursts
+RCVBUF_SIZE = 1 << 20
+
+# layout of the field struct on libfira.cpp (field_t):
+# the ball followed by the yellow and the blue bots,
+# all with (x, y, angle, vx, vy, vangle) doubles
+BALL_FIELDS = 6
+BOT_FIELDS = 6
+FIELD_SIZE = BALL_FIELDS + 2 * NUM_BOTS * BOT_FIELDS
+FIELD_FORMAT = f"{FIELD_SIZE}d"
+
 class Entity():
     '''
     Class used to determine the position, speed and direction 
     of any entity on the field.
     '''
+    __slots__ = ("x", "y", "vx", "vy", "a", "va", "index", "comment")
+
     def __init__(self, 
                     x=0.0, 
                     y=0.0, 
@@ -97,49 +187,27 @@ def convert_width(w) -> float:
     Converts width from the simulator data to centimetres
     with origin point on bottom left corner of field
     """
-    try:
-        return (WIDTH + w) * 100 
-    except TypeError:
-        return 0
+    return (WIDTH + w) * 100
 
 def inverse_width(w) -> float:
-    try:
-        return (w / 100) - WIDTH
-    except TypeError:
-        return 0
+    return (w / 100) - WIDTH
 
 def convert_length(d) -> float:
     """
     Converts width from the simulator data to centimetres
     with origin point on bottom left corner of field
     """
-    try:
-        return (LENGTH + d) * 100
-    except TypeError:
-        return 0
+    return (LENGTH + d) * 100
 
 def inverse_length(d) -> float:
-    try:
-        return (d / 100) - LENGTH
-    except TypeError:
-        return 0
+    return (d / 100) - LENGTH
 
 def convert_angle(a) -> float:
     """
     Converts the angle from full radians to 
     -Pi to Pi radians range
     """
-    try:
-        if a > 0:
-            if a > pi:
-                return a - 2*pi
-        else:
-            if a < -pi:
-                return a + 2*pi
-        return a
-
-    except TypeError:
-        return 0
+    return a - 2*pi * floor((a + pi) / (2*pi))
 
 
 # Client classes
@@ -150,12 +218,14 @@ class Vision():
     Use one instance at a time to minimize network errors.
     """
 
-    def __init__(self, mray, addr = "224.0.0.1", port = 10002):
+    def __init__(self, mray, addr = "224.0.0.1", port = 10002, 
+                    rcvbuf = RCVBUF_SIZE):
         """
         Constructor initialized with adress and port
 
         default address: "224.0.0.1"
         default port: 10002
+        default socket receive buffer: 1 MiB
         Fetches the first field.
         """
 
@@ -163,37 +233,86 @@ class Vision():
 
         # we need to convert the string type
         c_string = addr.encode('utf-8')
-        lib.actuator_init.argtypes = [c_char_p, c_uint16, c_bool]
 
-        lib.vision_init(c_string, c_uint16(port))
+        lib.vision_init(c_string, port)
+        lib.vision_set_rcvbuf(rcvbuf)
+
+        # lib functions bound once, so the hot methods
+        # skip the attribute lookup on the lib object
+        self._update_field = lib.vision_update_field
+        self._ball_x = lib.vision_get_ball_x
+        self._ball_y = lib.vision_get_ball_y
+        self._ball_vx = lib.vision_get_ball_vx
+        self._ball_vy = lib.vision_get_ball_vy
+        self._robot_x = lib.vision_robot_x
+        self._robot_y = lib.vision_robot_y
+        self._robot_angle = lib.vision_robot_angle
+        self._robot_vx = lib.vision_robot_vx
+        self._robot_vy = lib.vision_robot_vy
+        self._robot_vangle = lib.vision_robot_vangle
+
+        # view over the lib field struct, read with no lib calls
+        self._field_view = (c_double * FIELD_SIZE).from_address(
+            lib.vision_get_field_ptr())
+
+        # field data reused across frames, updated in place
+        yellow = [Entity(index=i) for i in range(NUM_BOTS)]
+        blue = [Entity(index=i) for i in range(NUM_BOTS)]
+        self._bots = yellow + blue
+        self._field = {
+            "mray": mray,
+            "yellow": yellow,
+            "blue": blue,
+            "our_bots": yellow if mray else blue,
+            "their_bots": blue if mray else yellow,
+            "ball": Entity(),
+        }
+
         # already update once
         self.update()
 
     def update(self):
         """Fetches client data."""
-        return lib.vision_update_field()
+        return self._update_field()
         
     def get_field_data(self):
         '''
             Returns a dict with the field info, 2 lists of entities
             one for each team robots and a ball entity
+            The same dict and entities are updated on every call.
         '''
         
-        field = dict()
+        field = self._field
         field["mray"] = self.mray
-        try:
-            field["yellow"] = [self.get_robot(i, True) for i in range(NUM_BOTS)]
-            field["blue"] = [self.get_robot(i, False) for i in range(NUM_BOTS)]
-            if self.mray:
-                field["our_bots"] = field["yellow"]
-                field["their_bots"] = field["blue"]
-            else:
-                field["our_bots"] = field["blue"]
-                field["their_bots"] = field["yellow"]
-            
-            field["ball"] = self.get_ball()
-        except TypeError:
-            return None
+        # reads the whole field struct to python floats at once
+        values = unpack_from(FIELD_FORMAT, self._field_view)
+
+        # converts every bot on a single pass, the position
+        # math is the same as convert_length and convert_width
+        i = BALL_FIELDS
+        for bot in self._bots:
+            x, y, a, vx, vy, va = values[i:i + BOT_FIELDS]
+            bot.x = (LENGTH + x) * 100
+            bot.y = (WIDTH + y) * 100
+            bot.a = convert_angle(a)
+            bot.vx = vx
+            bot.vy = vy
+            bot.va = va
+            i += BOT_FIELDS
+
+        if self.mray:
+            field["our_bots"] = field["yellow"]
+            field["their_bots"] = field["blue"]
+        else:
+            field["our_bots"] = field["blue"]
+            field["their_bots"] = field["yellow"]
+        
+        x, y, _, vx, vy, _ = values[:BALL_FIELDS]
+        ball = field["ball"]
+        ball.x = (LENGTH + x) * 100
+        ball.y = (WIDTH + y) * 100
+        ball.vx = vx
+        ball.vy = vy
 
         return field
 
@@ -203,17 +322,14 @@ class Vision():
         Use after the update method.
         """
 
-        try:
-            # fills and return the new object
-            ball = Entity()
-            # positions
-            ball.x = convert_length(lib.vision_get_ball_x())
-            ball.y = convert_width(lib.vision_get_ball_y())
-            # speds
-            ball.vx = lib.vision_get_ball_vx()
-            ball.vy = lib.vision_get_ball_vy()
-        except TypeError:
-            return None
+        # fills and return the new object
+        ball = Entity()
+        # positions
+        ball.x = convert_length(self._ball_x())
+        ball.y = convert_width(self._ball_y())
+        # speds
+        ball.vx = self._ball_vx()
+        ball.vy = self._ball_vy()
 
         return ball
 
@@ -224,42 +340,44 @@ class Vision():
         Use after the update method.
         """
 
-        try:
-            # fills and return bot object
-            # get position
-            bot = Entity()
-            bot.x = convert_length(
-                lib.vision_robot_x(c_int32(index), c_bool(yellow)))
-            bot.y = convert_width(
-                lib.vision_robot_y(c_int32(index), c_bool(yellow)))
-            bot.a = convert_angle(
-                lib.vision_robot_angle(c_int32(index), c_bool(yellow)))
-            # get speeds
-            bot.vx = lib.vision_robot_vx(c_int32(index), c_bool(yellow))
-            bot.vy = lib.vision_robot_vy(c_int32(index), c_bool(yellow))
-            bot.va = lib.vision_robot_vangle(c_int32(index), c_bool(yellow))
-            bot.index = index
+        # fills and return bot object
+        # get position
+        bot = Entity()
+        bot.x = convert_length(self._robot_x(index, yellow))
+        bot.y = convert_width(self._robot_y(index, yellow))
+        bot.a = convert_angle(self._robot_angle(index, yellow))
+        # get speeds
+        bot.vx = self._robot_vx(index, yellow)
+        bot.vy = self._robot_vy(index, yellow)
+        bot.va = self._robot_vangle(index, yellow)
+        bot.index = index
 
-        except TypeError:
-            return None
         return bot
 
-    def __del__(self):
-        """Closes network conection"""
+    def close(self):
+        """Closes network conection."""
         lib.vision_term()
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
 class Referee():
     """
     Referee client class, 
     Use one instance at a time to minimize network errors.
     """
 
-    def __init__(self, mray, addr = "224.5.23.2", port = 10003):
+    def __init__(self, mray, addr = "224.5.23.2", port = 10003, 
+                    rcvbuf = RCVBUF_SIZE):
         """
         Initialize client on addr and port
 
         default adress: "224.5.23.2"
         default port: 10003
+        default socket receive buffer: 1 MiB
         Fetches the first data.
         """
 
@@ -267,21 +385,41 @@ class Referee():
 
         # we need to convert the string type
         c_string = addr.encode('utf-8')
-        lib.referee_init.argtypes = [c_char_p, c_uint16]
 
-        lib.referee_init(c_string, c_uint16(port))
+        lib.referee_init(c_string, port)
+        lib.referee_set_rcvbuf(rcvbuf)
+
+        # lib functions bound once for the per tick calls
+        self._update = lib.referee_update
+        self._wait_update = lib.referee_wait_update
+        self._interrupt_type = lib.referee_get_interrupt_type
+        self._color = lib.referee_interrupt_color
+        self._quadrant = lib.referee_get_interrupt_quadrant
+
+        # referee data reused across calls, updated in place
+        self._data = dict()
+
         self.update()
 
     def update(self):
         """Fetches new referee data."""
-        lib.referee_update()
+        self._update()
+
+    def wait_update(self, timeout = 100):
+        """
+        Waits up to timeout milliseconds for new referee data 
+        and fetches it, returns if new data arrived.
+        The GIL is released while waiting, so other threads run.
+        """
+        return bool(self._wait_update(timeout))
 
     def get_data(self):
         """
         Returns a dict with the new data from referee
         or default values (game stoped).
+        The same dict is updated on every call.
         """
-        data = dict()
+        data = self._data
         
         try:
             data["foul"] = self.interrupt_type()
@@ -310,7 +448,7 @@ class Referee():
             GAME_ON = 6
             HALT = 7
         """
-        return lib.referee_get_interrupt_type()
+        return self._interrupt_type()
 
     def color(self):
         """
@@ -319,7 +457,7 @@ class Referee():
             YELLOW = 1,
             NONE = 2,
         """
-        return lib.referee_interrupt_color()
+        return self._color()
 
     def get_quadrant(self):
         """
@@ -330,12 +468,18 @@ class Referee():
             QUADRANT_3 = 3,
             QUADRANT_4 = 4,
         """
-        return lib.referee_get_interrupt_quadrant()
+        return self._quadrant()
 
-    def __del__(self):
+    def close(self):
         """Closes network conection."""
         lib.referee_term()
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
 class Actuator():
     """
     Actuator client class, 
@@ -353,38 +497,61 @@ class Actuator():
 
         # we need to convert the string type
         c_string = addr.encode('utf-8')
-        lib.actuator_init.argtypes = [c_char_p, c_uint16, c_bool]
 
-        lib.actuator_init(c_string, 
-                            c_uint16(port), 
-                            c_bool(my_robots_are_yellow))
+        lib.actuator_init(c_string, port, my_robots_are_yellow)
+
+        # lib functions bound once for the per tick calls
+        self._send_command = lib.actuator_send_command
+        self._send_all = lib.actuator_send_all
+
+        # (index, left, right) for each bot, sent on a single call
+        self._cmd = (c_double * (3 * NUM_BOTS))()
+
+        # zero speed for every bot, built once for stop
+        self._zero_cmd = (c_double * (3 * NUM_BOTS))()
+        for i in range(NUM_BOTS):
+            self._zero_cmd[3*i] = i
 
     def send(self, index, left, right):
         """
         sends motor speeds for one robot indicated by
         index on team initialized.
         """
-        lib.actuator_send_command(c_int32(index), 
-                                    c_double(left), 
-                                    c_double(right))
+        self._send_command(index, left, right)
 
     def send_all(self, speeds):
-        """sends a list of speed commands based on the passed list of dicts"""
-        for s in speeds:
+        """
+        sends the speed commands of all bots, speeds holds
+        one (left, right) pair for each bot index
+        """
+        cmd = self._cmd
+        n = 0
+        for i, speed in enumerate(speeds):
+            if i == NUM_BOTS:
+                break
             try:
-                self.send(s["index"], s["left"], s["right"])
+                cmd[3*n+1], cmd[3*n+2] = speed
+                cmd[3*n] = i
+                n += 1
             except Exception as e:
                 print("speed exception:", e)
 
+        self._send_all(cmd, n)
+
     def stop(self):
         """Sets all speeds to zero"""
-        for i in range(NUM_BOTS):
-            self.send(i, 0, 0)
+        self._send_all(self._zero_cmd, NUM_BOTS)
 
-    def __del__(self):
+    def close(self):
         """Closes network conection."""
         lib.actuator_term()
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
 class Replacer():
     """
     Actuator client class, 
@@ -400,50 +567,122 @@ class Replacer():
         requires bool team_color to later comands.
         """
         c_string = addr.encode('utf-8')
-        lib.actuator_init.argtypes = [c_char_p, c_uint16, c_bool]
 
-        lib.replacer_init(c_string, 
-                            c_uint16(port), 
-                            c_bool(my_robots_are_yellow))
+        lib.replacer_init(c_string, port, my_robots_are_yellow)
+
+        # lib functions bound once for the per call use
+        self._place_robot = lib.replacer_place_robot
+        self._place_all = lib.replacer_place_all
+        self._send_frame = lib.replacer_send_frame
+
+        # (index, x, y, angle) for each bot, sent on a single call
+        self._placement = (c_double * (4 * NUM_BOTS))()
 
     def place(self, index, x, y, angle):
         """
             Sends a index indicated bot to x, y and angle.
             *Needs to use seld.send() to actualy send, or use place_all
         """
-        lib.replacer_place_robot(c_int32(index), 
-                                    c_double(inverse_length(x)), 
-                                    c_double(inverse_width(y)), 
-                                    c_double(angle))
+        self._place_robot(index, 
+                            inverse_length(x), 
+                            inverse_width(y), 
+                            angle)
 
     def place_all(self, placement):
         """Sends a list of Entities locations"""
+        buf = self._placement
+        n = 0
         for p in placement:
+            if n == NUM_BOTS:
+                break
             try:
-                self.place(p.index, p.x, p.y, degrees(p.a))
+                buf[4*n], buf[4*n+1], buf[4*n+2], buf[4*n+3] = (
+                    p.index, 
+                    inverse_length(p.x), 
+                    inverse_width(p.y), 
+                    degrees(p.a))
+                n += 1
             except Exception as e:
                 print("placement exception:", e)
 
-        lib.replacer_send_frame()
+        self._place_all(buf, n)
 
     def send(self):
         '''Actualy sends the frame'''
-        lib.replacer_send_frame()
+        self._send_frame()
 
-    def __del__(self):
+    def close(self):
         """Closes network conection."""
         lib.replacer_term()
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+class Controller():
+    """
+    PID controller computed by the lib,
+    drives all bots to their objectives on a single call.
+    """
+
+    def __init__(self, kp = 20, kd = 2.5, base_speed = 30, goal_radius = 1.0):
+        """
+        Initialize controller with its gains and base motor speed
+        bots closer than goal_radius (centimetres) to the objective stop
+
+        default kp: 20
+        default kd: 2.5
+        default base_speed: 30
+        default goal_radius: 1.0
+        """
+        self.kp = kp
+        self.kd = kd
+        self.base_speed = base_speed
+        self.goal_radius = goal_radius
+
+        # buffers allocated once and shared with the lib
+        self._pose = (c_double * (3 * NUM_BOTS))()
+        self._goal = (c_double * (2 * NUM_BOTS))()
+        self._last_error = (c_double * NUM_BOTS)()
+        self._speeds = (c_double * (2 * NUM_BOTS))()
+
+        self._pid_step = lib.pid_step
+
+    def step(self, bots, objectives):
+        """
+        Returns one (left, right) pair for each bot, 
+        sending it to the objective on the same position.
+        Keeps each bot error for the derivative on the next step.
+        """
+        pose = self._pose
+        goal = self._goal
+        n = 0
+        for bot, obj in zip(bots, objectives):
+            if n == NUM_BOTS:
+                break
+            pose[3*n], pose[3*n+1], pose[3*n+2] = bot.x, bot.y, bot.a
+            goal[2*n], goal[2*n+1] = obj.x, obj.y
+            n += 1
+
+        self._pid_step(pose, goal, self._last_error, self._speeds, n, 
+                        self.kp, self.kd, self.base_speed, self.goal_radius)
+
+        speeds = self._speeds
+        return [(speeds[2*i], speeds[2*i+1]) for i in range(n)]
+
 # Base test run
 if __name__ == "__main__":
     try:
         mray = False
 
         # initializes all classes with default ports
-        vision = Vision(mray)
-        referee = Referee(mray)
-        actuator = Actuator(mray)
-        replacer = Replacer(mray)
+        with Vision(mray) as vision, \
+                Referee(mray) as referee, \
+                Actuator(mray) as actuator, \
+                Replacer(mray) as replacer:
+            pass
     except Exception as e:
         print("An error occured during execution:", e)
         exit()
@@ -37,6 +37,34 @@ void ActuatorClient::sendCommand(quint8 robotId, float wheelLeft, float wheelRig
     command->set_wheel_left(wheelLeft);
     command->set_wheel_right(wheelRight);
 
+    sendPacket(packet);
+}
+
+void ActuatorClient::sendCommands(const double *commands, int count) {
+    // Check if is connected and call run one time
+    if(!_isConnected) {
+        run();
+    }
+
+    // Creating packet with one command for each (id, left, right) triple
+    fira_message::sim_to_ref::Packet packet;
+    fira_message::sim_to_ref::Commands *commandsPacket = packet.mutable_cmd();
+
+    for(int i = 0; i < count; i++) {
+        const double *data = &commands[3 * i];
+        fira_message::sim_to_ref::Command *command = commandsPacket->add_robot_commands();
+
+        // Filling command with data
+        command->set_yellowteam((_teamColor == VSSRef::Color::YELLOW) ? true : false);
+        command->set_id(static_cast<quint8>(data[0]));
+        command->set_wheel_left(data[1]);
+        command->set_wheel_right(data[2]);
+    }
+
+    sendPacket(packet);
+}
+
+void ActuatorClient::sendPacket(fira_message::sim_to_ref::Packet &packet) {
     // Sending data to network
     std::string buffer;
     packet.SerializeToString(&buffer);
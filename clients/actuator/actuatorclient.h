@@ -11,10 +11,12 @@ public:
     using Client::Client;
     void setTeamColor(VSSRef::Color teamColor);
     void sendCommand(quint8 robotId, float wheelLeft, float wheelRight);
+    void sendCommands(const double *commands, int count);
 
 private:
     // Internal
     VSSRef::Color _teamColor;
+    void sendPacket(fira_message::sim_to_ref::Packet &packet);
 
     // Network management
     void connectToNetwork();
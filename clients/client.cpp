@@ -15,6 +15,22 @@ void Client::run() {
     runClient();
 }
 
+bool Client::waitForData(int msecs) {
+    // Blocks on the socket until a datagram arrives or msecs passes
+    if(!_isConnected) {
+        return false;
+    }
+
+    return _clientSocket->hasPendingDatagrams() || _clientSocket->waitForReadyRead(msecs);
+}
+
+void Client::setReceiveBufferSize(int bytes) {
+    // Sets the kernel receive buffer (SO_RCVBUF) of the socket
+    if(_isConnected) {
+        _clientSocket->setSocketOption(QAbstractSocket::ReceiveBufferSizeSocketOption, bytes);
+    }
+}
+
 void Client::close() {
     if(_isConnected) {
         disconnectFromNetwork();
@@ -15,6 +15,8 @@ public:
     // Run
     void run();
     void close();
+    bool waitForData(int msecs);
+    void setReceiveBufferSize(int bytes);
 
 protected:
     // Network data
@@ -27,30 +27,39 @@ void VisionClient::disconnectFromNetwork() {
 }
 
 void VisionClient::runClient() {
-    while(_clientSocket->hasPendingDatagrams()) {
-        // Creating auxiliary vars
-        fira_message::sim_to_ref::Environment environment;
-        QNetworkDatagram datagram;
+    // Only the newest environment is kept, so drain the socket
+    // and parse just the last valid datagram
+    QNetworkDatagram datagram;
+    bool hasDatagram = false;
 
+    while(_clientSocket->hasPendingDatagrams()) {
         // Reading datagram from network
-        datagram = _clientSocket->receiveDatagram();
+        QNetworkDatagram received = _clientSocket->receiveDatagram();
 
         // Check if datagram is valid (sender valid)
-        if(!datagram.isValid()) {
+        if(!received.isValid()) {
             continue;
         }
 
-        // Parsing datagram data to protobuf
-        if(environment.ParseFromArray(datagram.data().data(), datagram.data().size()) == false) {
-            std::cout << "[ERROR] Failure to parse protobuf data from datagram.\n";
-            continue;
-        }
+        datagram = received;
+        hasDatagram = true;
+    }
 
-        // Update last environment
-        _environmentMutex.lockForWrite();
-        _lastEnvironment = environment;
-        _environmentMutex.unlock();
+    if(!hasDatagram) {
+        return ;
     }
+
+    // Parsing datagram data to protobuf
+    fira_message::sim_to_ref::Environment environment;
+    if(environment.ParseFromArray(datagram.data().data(), datagram.data().size()) == false) {
+        std::cout << "[ERROR] Failure to parse protobuf data from datagram.\n";
+        return ;
+    }
+
+    // Update last environment
+    _environmentMutex.lockForWrite();
+    _lastEnvironment = environment;
+    _environmentMutex.unlock();
 }
 
 fira_message::sim_to_ref::Environment VisionClient::getLastEnvironment() {
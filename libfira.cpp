@@ -1,4 +1,5 @@
 #include <iostream>
+#include <cmath>
 #include <stdlib.h>
 #include <unistd.h>
 
@@ -10,6 +11,9 @@
 #define NUM_BOTS 3
 #define CONECTION_TRIES 100
 
+// error above which the bot drives backwards
+#define REVERSE_ANGLE (M_PI / 2.0 + M_PI / 20.0)
+
 typedef struct {
     double x, y, angle, vx, vy, vangle;
 } object_t;
@@ -27,6 +31,27 @@ RefereeClient *referee = NULL;
 ReplacerClient *replacer = NULL;
 ActuatorClient *actuator = NULL;
 
+// converts the angle to the -Pi to Pi range
+static inline double wrap_angle(double a)
+{
+    return a - 2 * M_PI * floor((a + M_PI) / (2 * M_PI));
+}
+
+// gets the smallest angle between two points in a arch
+static inline double smallest_angle_diff(double target, double source)
+{
+    double a = fmod(target + 2 * M_PI, 2 * M_PI) 
+                - fmod(source + 2 * M_PI, 2 * M_PI);
+
+    if (a > M_PI) {
+        a -= 2 * M_PI;
+    } else if (a < -M_PI) {
+        a += 2 * M_PI;
+    }
+
+    return a;
+}
+
 extern "C"
 {
     // function name starts with client function
@@ -45,6 +70,12 @@ extern "C"
         environment = vision->getLastEnvironment();
     }
 
+    // sets the vision socket receive buffer size in bytes
+    void vision_set_rcvbuf(int bytes)
+    {
+        vision->setReceiveBufferSize(bytes);
+    }
+
     // returns (bool) frame exists
     int vision_has_frame()
     {
@@ -198,6 +229,14 @@ extern "C"
         return field.ball.vy;
     }
 
+    // returns the address of the field struct, so the whole
+    // field can be read without a call for each value
+    // layout: ball, yellow_bots, blue_bots (see field_t)
+    const field_t *vision_get_field_ptr()
+    {
+        return &field;
+    }
+
     // closes network and terminates class
     void vision_term()
     {
@@ -214,11 +253,27 @@ extern "C"
         referee->run();
     }
 
+    // sets the referee socket receive buffer size in bytes
+    void referee_set_rcvbuf(int bytes)
+    {
+        referee->setReceiveBufferSize(bytes);
+    }
+
     // update referee data
     void referee_update()
     {
         referee->run();
     }
+
+    // blocks until referee data arrives or timeout_ms passes
+    // and then updates it, returns (bool) new data arrived
+    // holds no python state, so ctypes releases the GIL meanwhile
+    int referee_wait_update(int timeout_ms)
+    {
+        int arrived = referee->waitForData(timeout_ms);
+        referee->run();
+        return arrived;
+    }
     
     // return referee info from:
     // enum Foul : int {
@@ -288,6 +343,13 @@ extern "C"
         actuator->sendCommand(index, left, right);
     }
 
+    // send commands to many robots of the team on a single packet
+    // commands holds count (index, left, right) triples
+    void actuator_send_all(const double *commands, int count)
+    {
+        actuator->sendCommands(commands, count);
+    }
+
     // closes network and terminates class
     void actuator_term()
     {
@@ -321,10 +383,78 @@ extern "C"
         replacer->sendFrame();
     }
 
+    // place many robots and send the frame on a single call
+    // placements holds count (index, x, y, angle) quadruples
+    void replacer_place_all(const double *placements, int count)
+    {
+        for (int i = 0; i < count; i++) {
+            const double *p = &placements[4 * i];
+            replacer->placeRobot((int) p[0], p[1], p[2], p[3]);
+        }
+        replacer->sendFrame();
+    }
+
     // descontructor cuts network conection
     void replacer_term()
     {
         replacer->close();
     }
 
+    ////////////////////// Controller //////////////////////// 
+
+    // PID controller that drives n bots to their goals
+    // pose holds (x, y, angle) and goal holds (x, y) for each bot
+    // last_err holds each bot error from the last step and is updated
+    // out_lr receives the (left, right) motor speeds of each bot
+    // bots closer than radius to their goal are stopped
+    void pid_step(const double *pose, 
+                    const double *goal, 
+                    double *last_err, 
+                    double *out_lr, 
+                    int n, 
+                    double kp, 
+                    double kd, 
+                    double base, 
+                    double radius)
+    {
+        for (int i = 0; i < n; i++) {
+            const double *p = &pose[3 * i];
+            const double *g = &goal[2 * i];
+            double *lr = &out_lr[2 * i];
+
+            // already on the goal, no direction to follow
+            double dx = g[0] - p[0];
+            double dy = g[1] - p[1];
+            if (dx * dx + dy * dy < radius * radius) {
+                lr[0] = 0;
+                lr[1] = 0;
+                continue;
+            }
+
+            double angle_obj = atan2(dy, dx);
+            double error = smallest_angle_diff(p[2], angle_obj);
+
+            bool reversed = fabs(error) > REVERSE_ANGLE;
+            if (reversed) {
+                error = smallest_angle_diff(wrap_angle(p[2] + M_PI), angle_obj);
+            }
+
+            // set motor speed based on error and K constants
+            double error_speed = kp * error + kd * (error - last_err[i]);
+            last_err[i] = error;
+
+            // normalize
+            if (error_speed > base) error_speed = base;
+            if (error_speed < -base) error_speed = -base;
+
+            if (reversed) {
+                lr[0] = error_speed > 0 ? -base + error_speed : -base;
+                lr[1] = error_speed > 0 ? -base : -base - error_speed;
+            } else {
+                lr[0] = error_speed > 0 ? base : base + error_speed;
+                lr[1] = error_speed > 0 ? base - error_speed : base;
+            }
+        }
+    }
+
 }
@@ -1,9 +1,17 @@
 #!/usr/bin/env python3
 
-from bridge import (Actuator, Replacer, Vision, Referee, 
-                        NUM_BOTS, convert_angle, Entity)
+from bridge import (Actuator, Replacer, Vision, Referee, Controller, 
+                        NUM_BOTS, Entity)
 
-from math import pi, fmod, atan2, fabs
+from threading import Thread, Event
+
+# milliseconds the referee thread blocks waiting for data
+REFEREE_TIMEOUT = 100
+
+# controller gains and base motor speed
+KP = 20
+KD = 2.5
+BASE_SPEED = 30
 
 def main_strategy(field):
     """Sets all objetives to ball coordinates."""
@@ -15,120 +23,69 @@ def main_strategy(field):
 
     return objectives
 
-def smallestAngleDiff(target, source):
-    """Gets the smallest angle between two points in a arch"""
-    a = fmod(target + 2*pi, 2*pi) - fmod(source + 2 * pi, 2 * pi)
-
-    if (a > pi):
-        a -= 2 * pi
-    else:
-        if (a < -pi):
-            a += 2 * pi
-
-    return a
-
-
 def controller(field, objectives):
     """
         Basic PID controller that sets the speed of each motor 
         sends robot to objective coordinate
         Courtesy of RoboCin
     """
+    return controller.pid.step(field["our_bots"], objectives)
 
-    speeds = [{"index": i} for i in range(NUM_BOTS)]
-    our_bots = field["our_bots"]
-
-    # for each bot
-    for i, s in enumerate(speeds):
-        Kp = 20
-        Kd = 2.5
-
-        try:
-            controller.lastError
-        except AttributeError:
-            controller.lastError = 0
-
-        right_motor_speed = 0
-        left_motor_speed = 0
-
-        reversed = False
-        
-        objective = objectives[i]
-        our_bot = our_bots[i]
-
-        angle_rob = our_bot.a
-
-        angle_obj = atan2( objective.y - our_bot.y, 
-                            objective.x - our_bot.x )
+controller.pid = Controller(KP, KD, BASE_SPEED)
 
-        error = smallestAngleDiff(angle_rob, angle_obj)
-
-        if (fabs(error) > pi / 2.0 + pi / 20.0):
-            reversed = True
-            angle_rob = convert_angle(angle_rob + pi)
-            error = smallestAngleDiff(angle_rob, angle_obj)
-
-        # set motor speed based on error and K constants
-        error_speed = (Kp * error) + (Kd * (error - controller.lastError))
-        
-        controller.lastError = error
-
-        baseSpeed = 30
-
-        # normalize
-        error_speed = error_speed if error_speed < baseSpeed else baseSpeed
-        error_speed = error_speed if error_speed > -baseSpeed else -baseSpeed
-
-        if (error_speed > 0):
-            left_motor_speed = baseSpeed
-            right_motor_speed = baseSpeed - error_speed
-        else:
-            left_motor_speed = baseSpeed + error_speed
-            right_motor_speed = baseSpeed
-
-        if (reversed):
-            if (error_speed > 0):
-                left_motor_speed = -baseSpeed + error_speed
-                right_motor_speed = -baseSpeed
-            else:
-                left_motor_speed = -baseSpeed
-                right_motor_speed = -baseSpeed - error_speed
+def referee_loop(mray, addr, port, latest, ready):
+    """
+        Runs the referee client on its own thread, 
+        keeping a copy of the last data on latest["ref_data"]
+        so the main loop only waits on vision
+    """
+    with Referee(mray, addr, port) as referee:
+        # a new dict is published on a single assignment
+        latest["ref_data"] = dict(referee.get_data())
+        ready.set()
 
-        s["left"] = left_motor_speed
-        s["right"] = right_motor_speed
-    return speeds
+        while True:
+            # blocks inside the lib without holding the GIL
+            if referee.wait_update(REFEREE_TIMEOUT):
+                latest["ref_data"] = dict(referee.get_data())
 
 if __name__ == "__main__":
 
     # Choose team (my robots are yellow)
     mray = False
 
-    # Initialize all clients
-    actuator = Actuator(mray, "127.0.0.1", 20011)
-    replacement = Replacer(mray, "224.5.23.2", 10004)
-    vision = Vision(mray, "224.0.0.1", 10002)
-    referee = Referee(mray, "224.5.23.2", 10003)
+    # Initialize all clients, closed when the loop exits
+    with Actuator(mray, "127.0.0.1", 20011) as actuator, \
+            Replacer(mray, "224.5.23.2", 10004) as replacement, \
+            Vision(mray, "224.0.0.1", 10002) as vision:
 
-    # Main infinite loop
-    while True:
-        referee.update()
-        ref_data = referee.get_data()
+        # The referee is polled on a background thread
+        latest = dict()
+        ready = Event()
+        Thread(target=referee_loop, 
+                args=(mray, "224.5.23.2", 10003, latest, ready), 
+                daemon=True).start()
+        ready.wait()
 
-        vision.update()
-        field = vision.get_field_data()
+        # Main infinite loop
+        while True:
+            ref_data = latest["ref_data"]
 
-        if ref_data["game_on"]:
+            vision.update()
+            field = vision.get_field_data()
 
-            objectives = main_strategy(field)
+            if ref_data["game_on"]:
 
-            speeds = controller(field, objectives)
+                objectives = main_strategy(field)
 
-            actuator.send_all(speeds)
+                speeds = controller(field, objectives)
 
-        elif ref_data["foul"] != 7:
-            # foul behaviour
-            actuator.stop()
+                actuator.send_all(speeds)
 
-        else:
-            # halt behavior
-            actuator.stop()
\ No newline at end of file
+            elif ref_data["foul"] != 7:
+                # foul behaviour
+                actuator.stop()
+
+            else:
+                # halt behavior
+                actuator.stop()